@@ -1,12 +1,57 @@
-import google.generativeai as genai
+import functools
 import os
+import subprocess
+
+import google.auth
+from google.auth.exceptions import DefaultCredentialsError
+import google.generativeai as genai
+
+SECRET_ID = "gemini-api-key"
+
+def _read_secret_with_gcloud() -> str:
+    """Read the latest secret version with the gcloud CLI (uses gcloud's configured project)"""
+    return subprocess.run(
+        ["gcloud", "secrets", "versions", "access", "latest", f"--secret={SECRET_ID}"],
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+@functools.lru_cache(maxsize=1)
+def get_api_key() -> str:
+    """
+    Return the Gemini API key: GEMINI_API_KEY if set, otherwise read once from Secret Manager.
+
+    Secret Manager is read with the optional google-cloud-secret-manager package
+    (pip install google-cloud-secret-manager; not in requirements.txt) when it is
+    installed and Application Default Credentials with a project are available.
+    Otherwise the gcloud CLI is used.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if api_key:
+        return api_key.strip()
+
+    try:
+        from google.cloud import secretmanager
+    except ImportError:
+        # Client library not installed - fall back to the gcloud CLI
+        return _read_secret_with_gcloud()
+
+    try:
+        _, project_id = google.auth.default()
+    except DefaultCredentialsError:
+        # No Application Default Credentials (e.g. only `gcloud auth login` was run)
+        return _read_secret_with_gcloud()
+    if not project_id:
+        # Credentials carry no project (e.g. user ADC without a quota project)
+        return _read_secret_with_gcloud()
+
+    client = secretmanager.SecretManagerServiceClient()
+    name = f"projects/{project_id}/secrets/{SECRET_ID}/versions/latest"
+    return client.access_secret_version(name=name).payload.data.decode("utf-8").strip()
 
-# Get your API key
-api_key = os.popen("gcloud secrets versions access latest --secret='gemini-api-key'").read().strip()
-genai.configure(api_key=api_key)
+genai.configure(api_key=get_api_key())
 
 # List all available models
 print("Available models:")
 for model in genai.list_models():
     if 'generateContent' in model.supported_generation_methods:
-        print(f"  - {model.name}")
\ No newline at end of file
+        print(f"  - {model.name}")
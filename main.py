@@ -3,21 +3,29 @@ A2A Protocol Compliant AI Agent
 Main FastAPI application for Google Cloud Run deployment
 """
 
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Security, Request
+from fastapi import FastAPI, HTTPException, Depends, Security, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel
-from typing import Dict, Any, Optional, List, Literal, Union
+from fastapi.responses import Response, JSONResponse, ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Dict, Any, Optional, List, Literal, Set, Union, Callable
 from enum import Enum
-import json
-import uuid
+import orjson
 import asyncio
+import functools
+import hashlib
 import logging
 import os
+import re
+import secrets
+import threading
 import time
-from datetime import datetime
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from cachetools import TTLCache
 
 # Load environment variables
 load_dotenv()
@@ -45,6 +53,14 @@ for env_var in ["GOOGLE_CLOUD_PROJECT", "GCP_PROJECT", "GCLOUD_PROJECT"]:
 raw_api_key = os.getenv("GEMINI_API_KEY")
 GEMINI_API_KEY = None
 GEMINI_MODEL = None  # Will be set after successful initialization
+GEMINI_CLIENT = None  # Shared GenerativeModel, built once and reused by all handlers
+
+# Native async calls (generate_content_async) require the gRPC transport. REST stays
+# the default because of the Cloud Run credential conflicts described below.
+GEMINI_ASYNC_CLIENT = os.getenv("GEMINI_ASYNC_CLIENT", "false").lower() == "true"
+
+# Anything outside printable, non-space ASCII (0x21-0x7E) cannot be part of a key
+_KEY_STRIP_RE = re.compile(r'[^\x21-\x7e]')
 
 # Aggressively clean the API key
 if raw_api_key:
@@ -52,11 +68,8 @@ if raw_api_key:
     logger.info(f"Raw API key length: {len(raw_api_key)}")
     logger.info(f"Raw API key repr: {repr(raw_api_key[:10])}...")
     
-    # Strip all whitespace and control characters
-    cleaned_key = raw_api_key.strip().replace('\n', '').replace('\r', '').replace('\t', '').replace(' ', '')
-    
-    # Remove any non-ASCII characters
-    cleaned_key = ''.join(c for c in cleaned_key if ord(c) < 128 and c.isprintable())
+    # Strip whitespace, control and non-ASCII characters in one pass
+    cleaned_key = _KEY_STRIP_RE.sub('', raw_api_key)
     
     # Final validation - API keys should be 39 chars
     if len(cleaned_key) == 39 and cleaned_key.startswith('AIza'):
@@ -70,56 +83,340 @@ else:
     logger.error("GEMINI_API_KEY not found in environment variables")
     logger.error(f"Available env vars: {list(os.environ.keys())}")
 
-if GEMINI_API_KEY:
+def init_gemini():
+    """
+    Configure the Gemini SDK and build the shared client.
+
+    Called from the app lifespan rather than at import so cold starts are not
+    held up by the SDK setup. No test prompt is sent; the startup warm-up call
+    (count_tokens, not billed) surfaces credential problems instead.
+    """
+    global GEMINI_API_KEY, GEMINI_MODEL, GEMINI_CLIENT
+
+    if not GEMINI_API_KEY:
+        logger.warning("GEMINI_API_KEY not available. AI capabilities will not work.")
+        return
+
     try:
-        # IMPORTANT: Force REST transport to avoid gRPC metadata conflicts in Cloud Run
-        logger.info("Configuring Gemini API with REST transport...")
-        
-        # Try configuring with REST transport (if supported in your SDK version)
-        try:
-            genai.configure(
-                api_key=GEMINI_API_KEY,
-                transport="rest"  # This forces REST instead of gRPC
-            )
-            logger.info("Configured with REST transport")
-        except TypeError:
-            # Fallback if transport parameter not supported
-            logger.info("REST transport not supported, using default")
+        if GEMINI_ASYNC_CLIENT:
+            # Default (gRPC) transport so generate_content_async can multiplex on the event loop
+            logger.info("Configuring Gemini API with gRPC transport (async client enabled)...")
             genai.configure(api_key=GEMINI_API_KEY)
-        
-        # Test with a simple model
-        test_model_name = "gemini-2.5-flash"
-        logger.info(f"Testing with {test_model_name}...")
-        
-        generation_config = {
-            "temperature": 0.7,
-            "max_output_tokens": 2048,
-        }
-        
-        test_model = genai.GenerativeModel(
-            test_model_name,
-            generation_config=generation_config
-        )
-        test_response = test_model.generate_content("Say OK")
-        
-        if test_response and test_response.text:
-            GEMINI_MODEL = test_model_name
-            logger.info(f"✓ SUCCESS: Gemini API working with {GEMINI_MODEL}")
-            logger.info(f"Test response: {test_response.text[:50]}")
         else:
-            logger.error("Model returned empty response")
-            GEMINI_API_KEY = None
-            
+            # IMPORTANT: Force REST transport to avoid gRPC metadata conflicts in Cloud Run
+            logger.info("Configuring Gemini API with REST transport...")
+
+            # Try configuring with REST transport (if supported in your SDK version)
+            try:
+                genai.configure(
+                    api_key=GEMINI_API_KEY,
+                    transport="rest"  # This forces REST instead of gRPC
+                )
+                logger.info("Configured with REST transport")
+            except TypeError:
+                # Fallback if transport parameter not supported
+                logger.info("REST transport not supported, using default")
+                genai.configure(api_key=GEMINI_API_KEY)
+
+        GEMINI_MODEL = "gemini-2.5-flash"
+        GEMINI_CLIENT = genai.GenerativeModel(GEMINI_MODEL)
+        logger.info(f"✓ Gemini client ready for {GEMINI_MODEL}")
+
     except Exception as e:
         logger.error(f"Failed to initialize Gemini: {str(e)}")
         logger.error(f"Exception type: {type(e).__name__}")
-        if "API_KEY_INVALID" in str(e) or "403" in str(e):
-            logger.error("Authentication failed - likely credential conflict with Cloud Run")
         GEMINI_API_KEY = None
         GEMINI_MODEL = None
-else:
-    logger.warning("GEMINI_API_KEY not available. AI capabilities will not work.")
-    GEMINI_MODEL = None
+        GEMINI_CLIENT = None
+
+# ============================================================================
+# GEMINI RESPONSE CACHE
+# ============================================================================
+
+# Identical prompts are answered from memory instead of a new Gemini round-trip.
+# Entries are persisted to LLM_CACHE_FILE on shutdown and reloaded at startup
+# (set LLM_CACHE_FILE to an empty string to keep the cache in memory only).
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", "data/llm_cache.json")
+
+# Blocking Gemini calls run in the event loop's default executor via asyncio.to_thread;
+# size it for the expected number of concurrent in-flight requests
+GEMINI_THREAD_POOL_SIZE = int(os.getenv("GEMINI_THREAD_POOL_SIZE", "32"))
+
+# Upper bound on concurrently processed tasks, to stay under the API quota instead of
+# fanning out into 429 retry storms during bursts. Tasks waiting for a slot remain
+# "pending". This limits waiting callers, not worker threads: when a call times out
+# the slot is released, but the blocking SDK call keeps running in its thread until
+# it returns. Under repeated timeouts more calls than this can be in flight; the
+# hard ceiling is GEMINI_THREAD_POOL_SIZE.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+_gemini_semaphore: Optional[asyncio.Semaphore] = None
+
+def _get_gemini_semaphore() -> asyncio.Semaphore:
+    """Create the semaphore lazily so it binds to the server's running event loop"""
+    global _gemini_semaphore
+    if _gemini_semaphore is None:
+        _gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    return _gemini_semaphore
+
+_llm_cache: "OrderedDict[str, str]" = OrderedDict()
+_llm_cache_lock = threading.Lock()  # cached_generate runs in worker threads
+
+def _llm_cache_key(
+    method: str,
+    model_name: str,
+    prompt: str,
+    generation_config: Optional[Dict[str, Any]] = None
+) -> str:
+    """BLAKE2b-128 of (method, model, response MIME type, whitespace-normalized prompt)"""
+    normalized_prompt = " ".join(prompt.split())
+    mime_type = (generation_config or {}).get("response_mime_type", "")
+    return hashlib.blake2b(
+        f"{method}\x00{model_name}\x00{mime_type}\x00{normalized_prompt}".encode("utf-8"),
+        digest_size=16
+    ).hexdigest()
+
+def _llm_cache_get(key: str) -> Optional[str]:
+    """Return a cached response (marking it most recently used) or None"""
+    with _llm_cache_lock:
+        if key in _llm_cache:
+            _llm_cache.move_to_end(key)
+            return _llm_cache[key]
+    return None
+
+def _llm_cache_put(key: str, text: str):
+    """Store a response, evicting the least recently used entries over capacity"""
+    with _llm_cache_lock:
+        _llm_cache[key] = text
+        _llm_cache.move_to_end(key)
+        while len(_llm_cache) > LLM_CACHE_MAX_ENTRIES:
+            _llm_cache.popitem(last=False)
+
+def cached_generate(
+    model_name: str,
+    prompt: str,
+    method: str = "",
+    on_chunk: Optional[Callable[[str], None]] = None,
+    model: Any = None,
+    generation_config: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Generate text with Gemini, serving repeated prompts from the LRU cache.
+    Blocking call - run it via asyncio.to_thread from async handlers.
+
+    If on_chunk is given, the response is streamed and on_chunk is called
+    with each text chunk as it arrives (from the calling worker thread).
+    model overrides GEMINI_CLIENT (e.g. a context-cached skill model);
+    generation_config is passed through to generate_content.
+    """
+    key = _llm_cache_key(method, model_name, prompt, generation_config)
+    cached = _llm_cache_get(key)
+    if cached is not None:
+        return cached
+
+    model = model or GEMINI_CLIENT
+
+    if on_chunk:
+        chunks = []
+        for chunk in model.generate_content(prompt, generation_config=generation_config, stream=True):
+            if chunk.parts:
+                chunks.append(chunk.text)
+                on_chunk(chunk.text)
+        text = "".join(chunks)
+    else:
+        response = model.generate_content(prompt, generation_config=generation_config)
+        text = response.text
+    _llm_cache_put(key, text)
+
+    return text
+
+# Gemini calls in flight, by LLM cache key: [shared task, number of waiting callers]
+_inflight_generations: Dict[str, list] = {}
+
+async def _run_shared_generation(
+    key: str,
+    method: str,
+    prompt: str,
+    on_chunk: Optional[Callable[[str], None]],
+    model: Any,
+    generation_config: Optional[Dict[str, Any]]
+) -> str:
+    """Run one coalesced Gemini call as its own task, owned by no single caller"""
+    try:
+        return await _generate_text_now(method, prompt, on_chunk, model, generation_config)
+    finally:
+        # Only remove our own entry - a cancelled call's entry may already have
+        # been replaced by a fresh call for the same key
+        entry = _inflight_generations.get(key)
+        if entry is not None and entry[0] is asyncio.current_task():
+            del _inflight_generations[key]
+
+async def generate_text(
+    method: str,
+    prompt: str,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    model: Any = None,
+    generation_config: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Generate text with Gemini without blocking the event loop.
+
+    Uses generate_content_async when GEMINI_ASYNC_CLIENT is enabled, otherwise runs
+    cached_generate in a worker thread.
+
+    If on_chunk is given, the response is streamed and on_chunk is called on the
+    event loop with each text chunk as it arrives. model overrides GEMINI_CLIENT;
+    generation_config is passed through to the Gemini call.
+
+    Identical concurrent calls (same cache key) are coalesced into one shared
+    task: later callers get its result without streamed chunks. A caller that
+    times out or is cancelled only stops waiting; the call itself is cancelled
+    once no caller is waiting for it.
+    """
+    key = _llm_cache_key(method, GEMINI_MODEL, prompt, generation_config)
+    entry = _inflight_generations.get(key)
+    chunk_target = None
+    if entry is None or entry[0].done():
+        relay = None
+        if on_chunk:
+            # Chunks go to the starting caller only while it is still waiting
+            chunk_target = [on_chunk]
+
+            def relay(text: str):
+                if chunk_target[0]:
+                    chunk_target[0](text)
+
+        shared = asyncio.create_task(
+            _run_shared_generation(key, method, prompt, relay, model, generation_config)
+        )
+        # Mark the outcome as retrieved even if every caller has stopped waiting
+        shared.add_done_callback(lambda t: t.cancelled() or t.exception())
+        entry = _inflight_generations[key] = [shared, 0]
+
+    entry[1] += 1
+    try:
+        # shield: cancelling one caller must not cancel the shared call
+        return await asyncio.shield(entry[0])
+    finally:
+        entry[1] -= 1
+        if chunk_target:
+            chunk_target[0] = None
+        if entry[1] == 0 and not entry[0].done():
+            # Unregister in the same step, so an identical call arriving before
+            # the cancellation lands starts a fresh call instead of joining this one
+            if _inflight_generations.get(key) is entry:
+                del _inflight_generations[key]
+            entry[0].cancel()
+
+async def _generate_text_now(
+    method: str,
+    prompt: str,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    model: Any = None,
+    generation_config: Optional[Dict[str, Any]] = None
+) -> str:
+    """Issue a single Gemini call (see generate_text)"""
+    if not GEMINI_ASYNC_CLIENT:
+        thread_on_chunk = None
+        if on_chunk:
+            loop = asyncio.get_running_loop()
+            thread_on_chunk = lambda text: loop.call_soon_threadsafe(on_chunk, text)
+
+        return await asyncio.to_thread(
+            cached_generate, GEMINI_MODEL, prompt, method, thread_on_chunk, model, generation_config
+        )
+
+    key = _llm_cache_key(method, GEMINI_MODEL, prompt, generation_config)
+    cached = _llm_cache_get(key)
+    if cached is not None:
+        return cached
+
+    model = model or GEMINI_CLIENT
+
+    if on_chunk:
+        chunks = []
+        async for chunk in await model.generate_content_async(
+            prompt, generation_config=generation_config, stream=True
+        ):
+            if chunk.parts:
+                chunks.append(chunk.text)
+                on_chunk(chunk.text)
+        text = "".join(chunks)
+    else:
+        response = await model.generate_content_async(prompt, generation_config=generation_config)
+        text = response.text
+    _llm_cache_put(key, text)
+
+    return text
+
+async def warm_gemini_connection():
+    """
+    Open the shared Gemini client's connection ahead of the first real request.
+
+    All calls go through GEMINI_CLIENT, so the SDK's cached transport (HTTP session
+    or gRPC channel) is reused across requests; this pays its TLS/DNS setup once at
+    startup. count_tokens is used because it is not billed. An authentication
+    failure here disables Gemini, as the old import-time test prompt did.
+    """
+    global GEMINI_API_KEY, GEMINI_MODEL, GEMINI_CLIENT
+
+    try:
+        if GEMINI_ASYNC_CLIENT:
+            await GEMINI_CLIENT.count_tokens_async("ping")
+        else:
+            await asyncio.to_thread(GEMINI_CLIENT.count_tokens, "ping")
+        logger.info("✓ Gemini connection warmed")
+    except Exception as e:
+        if "API_KEY_INVALID" in str(e) or "403" in str(e):
+            # The key will never work - report Gemini as unconfigured
+            logger.error(f"Gemini authentication failed - likely credential conflict with Cloud Run: {e}")
+            GEMINI_API_KEY = None
+            GEMINI_MODEL = None
+            GEMINI_CLIENT = None
+        else:
+            logger.warning(f"Gemini connection warm-up failed: {e}")
+
+def load_llm_cache():
+    """Load persisted Gemini responses from LLM_CACHE_FILE (if present)"""
+    if not LLM_CACHE_FILE or not os.path.exists(LLM_CACHE_FILE):
+        return
+
+    try:
+        with open(LLM_CACHE_FILE, "rb") as f:
+            entries = orjson.loads(f.read())
+        with _llm_cache_lock:
+            for key, text in list(entries.items())[-LLM_CACHE_MAX_ENTRIES:]:
+                _llm_cache[key] = text
+        logger.info(f"✓ Loaded {len(_llm_cache)} cached Gemini response(s) from {LLM_CACHE_FILE}")
+    except (OSError, ValueError, AttributeError) as e:
+        logger.warning(f"Failed to load Gemini response cache from {LLM_CACHE_FILE}: {e}")
+
+def save_llm_cache():
+    """Persist cached Gemini responses to LLM_CACHE_FILE"""
+    if not LLM_CACHE_FILE:
+        return
+
+    try:
+        with _llm_cache_lock:
+            entries = dict(_llm_cache)
+        cache_dir = os.path.dirname(LLM_CACHE_FILE)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        with open(LLM_CACHE_FILE, "wb") as f:
+            f.write(orjson.dumps(entries))
+        logger.info(f"Saved {len(entries)} cached Gemini response(s) to {LLM_CACHE_FILE}")
+    except OSError as e:
+        logger.warning(f"Failed to save Gemini response cache to {LLM_CACHE_FILE}: {e}")
+
+def utc_now_iso() -> str:
+    """Current UTC time as a naive ISO-8601 string (format used by all task timestamps)"""
+    # datetime.utcnow() is deprecated since 3.12; drop the tzinfo to keep the
+    # offset-less format existing clients parse
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+def new_task_id() -> str:
+    """Opaque random task id (32 hex chars) - skips building a uuid.UUID object"""
+    return secrets.token_hex(16)
 
 # ============================================================================
 # BEARER TOKEN AUTHENTICATION SETUP
@@ -130,16 +427,19 @@ security = HTTPBearer()
 
 # Load and parse API keys from environment variable
 API_KEYS: Dict[str, Dict[str, Any]] = {}
+API_KEY_EXPIRIES: Dict[str, Optional[float]] = {}  # token -> expiry as a Unix timestamp
 raw_api_keys = os.getenv("API_KEYS")
 
 if raw_api_keys:
     try:
         # Parse JSON structure: {"key1": {"name": "User 1", "created": "...", "expires": null}, ...}
-        API_KEYS = json.loads(raw_api_keys.strip())
+        API_KEYS = orjson.loads(raw_api_keys.strip())
 
         # Validate and normalize API key configurations (Option 5: API Key-Based Sync Mode)
         for key_token, key_info in API_KEYS.items():
-            # Set defaults for new fields
+            # Set defaults for new fields (name is normalized here so request
+            # handlers can index auth["name"] directly)
+            key_info.setdefault("name", "Unknown")
             if "mode" not in key_info:
                 key_info["mode"] = "async"  # Default to async for backwards compatibility
             if "timeout" not in key_info:
@@ -147,26 +447,38 @@ if raw_api_keys:
 
             # Validate mode
             if key_info["mode"] not in ["sync", "async"]:
-                logger.warning(f"Invalid mode '{key_info['mode']}' for key '{key_info.get('name', 'unknown')}', defaulting to 'async'")
+                logger.warning(f"Invalid mode '{key_info['mode']}' for key '{key_info['name']}', defaulting to 'async'")
                 key_info["mode"] = "async"
 
             # Validate timeout
             if not isinstance(key_info["timeout"], (int, float)) or key_info["timeout"] <= 0:
-                logger.warning(f"Invalid timeout {key_info['timeout']} for key '{key_info.get('name', 'unknown')}', defaulting to 60")
+                logger.warning(f"Invalid timeout {key_info['timeout']} for key '{key_info['name']}', defaulting to 60")
                 key_info["timeout"] = 60
 
+            # Parse expiry once; naive timestamps are taken as UTC
+            expires = key_info.get("expires")
+            API_KEY_EXPIRIES[key_token] = None
+            if expires:
+                try:
+                    expiry_date = datetime.fromisoformat(expires.replace('Z', '+00:00'))
+                    if expiry_date.tzinfo is None:
+                        expiry_date = expiry_date.replace(tzinfo=timezone.utc)
+                    API_KEY_EXPIRIES[key_token] = expiry_date.timestamp()
+                except (ValueError, AttributeError):
+                    logger.error(f"Invalid expiry date format for key '{key_info['name']}': {expires}")
+
         logger.info(f"✓ Loaded {len(API_KEYS)} API key(s) for authentication")
 
         # Log key names and configurations (not the actual keys)
         for key_token, key_info in API_KEYS.items():
-            key_name = key_info.get('name', 'Unknown')
+            key_name = key_info['name']
             key_prefix = key_token[:8] if len(key_token) >= 8 else key_token[:4]
             expires = key_info.get('expires', 'never')
             mode = key_info.get('mode', 'async')
             timeout = key_info.get('timeout', 60)
             logger.info(f"  - Key for '{key_name}' ({key_prefix}...) expires: {expires}, mode: {mode}, timeout: {timeout}s")
 
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"Failed to parse API_KEYS JSON: {e}")
         logger.warning("Authentication will be DISABLED due to invalid API_KEYS format")
         API_KEYS = {}
@@ -191,26 +503,20 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Security(secu
         )
 
     key_info = API_KEYS[token]
-    key_name = key_info.get('name', 'Unknown')
+    key_name = key_info['name']
 
-    # Check if key has expired
-    expires = key_info.get('expires')
-    if expires:
-        try:
-            from datetime import datetime
-            expiry_date = datetime.fromisoformat(expires.replace('Z', '+00:00'))
-            if datetime.utcnow() > expiry_date:
-                logger.warning(f"Authentication failed: Expired token for '{key_name}'")
-                raise HTTPException(
-                    status_code=401,
-                    detail="Token has expired",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-        except ValueError:
-            logger.error(f"Invalid expiry date format for key '{key_name}': {expires}")
+    # Check if key has expired (expiry is parsed once when API_KEYS is loaded)
+    expires_at = API_KEY_EXPIRIES.get(token)
+    if expires_at is not None and time.time() > expires_at:
+        logger.warning(f"Authentication failed: Expired token for '{key_name}'")
+        raise HTTPException(
+            status_code=401,
+            detail="Token has expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-    # Log successful authentication
-    logger.info(f"✓ Authenticated request from: {key_name}")
+    # Log successful authentication (debug level - this runs on every request)
+    logger.debug(f"✓ Authenticated request from: {key_name}")
 
     return key_info
 
@@ -235,17 +541,105 @@ async def verify_token_optional(credentials: Optional[HTTPAuthorizationCredentia
 
     return await verify_token(credentials)
 
+_gemini_warmup_task: Optional[asyncio.Task] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup: thread pool, Gemini client, LLM cache, warm-up. Shutdown: persist and clean up."""
+    global _gemini_warmup_task, _context_cache_refresher
+
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=GEMINI_THREAD_POOL_SIZE, thread_name_prefix="gemini")
+    )
+    await asyncio.to_thread(init_gemini)
+    await asyncio.to_thread(load_llm_cache)
+
+    if GEMINI_CLIENT:
+        _gemini_warmup_task = asyncio.create_task(warm_gemini_connection())
+
+    if GEMINI_CONTEXT_CACHE and GEMINI_CLIENT:
+        await asyncio.to_thread(create_context_caches)
+        if _context_caches:
+            _context_cache_refresher = asyncio.create_task(refresh_context_caches())
+
+    yield
+
+    if _context_cache_refresher:
+        _context_cache_refresher.cancel()
+    await asyncio.to_thread(save_llm_cache)
+
+    # In-flight work dies with the process - report it as failed rather than
+    # leaving pending/running tasks behind
+    for task in list(tasks.values()):
+        if task["status"] not in TERMINAL_TASK_STATES:
+            update_task(task, status=TaskState.FAILED, error="Server shut down before the task finished", failed_at=utc_now_iso())
+
 app = FastAPI(
     title="A2A AI Agent",
     description="Agent2Agent Protocol Compliant AI Agent",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Mount static files for .well-known directory
 app.mount("/.well-known", StaticFiles(directory=".well-known"), name="well-known")
 
 # In-memory task storage (for POC - use proper storage in production)
-tasks: Dict[str, Dict] = {}
+# Bounded: tasks expire TASK_TTL seconds after creation, and the oldest are
+# evicted once MAX_TASKS is reached, so memory stays flat under sustained load.
+MAX_TASKS = int(os.getenv("MAX_TASKS", "10000"))
+TASK_TTL = int(os.getenv("TASK_TTL", "3600"))
+# Upper bound on a task's handler run (excluding time queued for a Gemini slot)
+TASK_TIMEOUT = int(os.getenv("TASK_TIMEOUT", "60"))
+tasks: Dict[str, Dict] = TTLCache(maxsize=MAX_TASKS, ttl=TASK_TTL)
+
+# Per-task update events for SSE subscribers (kept outside the task dicts so the
+# tasks stay JSON-serializable). Created by subscribers, fired by update_task().
+task_events: Dict[str, asyncio.Event] = {}
+
+def notify_task_update(task_id: str):
+    """Wake any SSE streams waiting for this task to change"""
+    event = task_events.pop(task_id, None)
+    if event is not None:
+        event.set()
+
+# Task ids per owner (created_by) in creation order, so tasks/list only walks
+# the caller's tasks. Ids of tasks that have left the store are pruned lazily.
+_task_ids_by_owner: Dict[str, "OrderedDict[str, None]"] = {}
+
+def store_task(task: Dict[str, Any]):
+    """Add a new task to the store and to its owner's index"""
+    task_id = task["task_id"]
+    tasks[task_id] = task
+
+    owner_ids = _task_ids_by_owner.setdefault(task["created_by"], OrderedDict())
+    owner_ids[task_id] = None
+    owner_ids.move_to_end(task_id)
+
+    # Drop ids at the old end whose tasks have expired or been evicted
+    while owner_ids:
+        oldest = next(iter(owner_ids))
+        if oldest in tasks:
+            break
+        del owner_ids[oldest]
+
+def update_task(task: Dict[str, Any], **fields):
+    """Apply field updates to a task and wake its SSE subscribers"""
+    task.update(fields)
+    notify_task_update(task["task_id"])
+
+# Async-mode task processors run as plain event loop tasks so they start right
+# away rather than after the response is sent. The loop only keeps weak
+# references to tasks, so hold them here until they finish.
+_running_processors: Set[asyncio.Task] = set()
+
+def spawn_task_processor(coro) -> asyncio.Task:
+    """Schedule a task processor coroutine on the event loop"""
+    processor = asyncio.create_task(coro)
+    _running_processors.add(processor)
+    processor.add_done_callback(_running_processors.discard)
+    return processor
 
 # A2A Protocol v0.3.0 Task States
 class TaskState(str, Enum):
@@ -259,6 +653,9 @@ class TaskState(str, Enum):
     REJECTED = "rejected"            # Agent declined execution
     FAILED = "failed"                # Error terminal state
 
+# States after which a task never changes again
+TERMINAL_TASK_STATES = frozenset({TaskState.COMPLETED, TaskState.CANCELED, TaskState.REJECTED, TaskState.FAILED})
+
 # Pydantic models for A2A protocol
 class TaskRequest(BaseModel):
     method: str
@@ -274,6 +671,8 @@ class TaskStatus(BaseModel):
     created_at: Optional[str] = None
     created_by: Optional[str] = None
 
+TASK_STATUS_FIELDS = tuple(TaskStatus.model_fields)
+
 # A2A Protocol v0.3.0 Message/Part Data Structures
 class TextPart(BaseModel):
     """Text content part of a message"""
@@ -328,17 +727,67 @@ class JsonRpcResponse(BaseModel):
     error: Optional[Dict[str, Any]] = None
     id: Union[str, int]
 
+# Legacy method params - validated before a task is created so bad requests are
+# rejected synchronously (same limits the capability handlers enforce)
+class SummarizeParams(BaseModel):
+    """Parameters for text.summarize"""
+    text: str = Field(min_length=10, max_length=50000)
+    max_length: int = 100
+
+class SentimentParams(BaseModel):
+    """Parameters for text.analyze_sentiment"""
+    text: str = Field(min_length=1, max_length=5000)
+
+class ExtractParams(BaseModel):
+    """Parameters for data.extract"""
+    text: str = Field(min_length=1, max_length=10000)
+    schema_: Dict[str, Any] = Field(default_factory=dict, alias="schema")
+
+LEGACY_PARAMS_MODELS = {
+    "text.summarize": SummarizeParams,
+    "text.analyze_sentiment": SentimentParams,
+    "data.extract": ExtractParams,
+}
+LEGACY_METHODS = frozenset(LEGACY_PARAMS_MODELS)
+
+# message/send skills run the same handlers, so they share the text limits
+SKILL_PARAMS_MODELS = {
+    "summarization": SummarizeParams,
+    "sentiment-analysis": SentimentParams,
+    "entity-extraction": ExtractParams,
+}
+
+def _rpc_ok(result: Any, request_id: Any) -> Dict[str, Any]:
+    """JSON-RPC 2.0 success envelope"""
+    return {"jsonrpc": "2.0", "result": result, "id": request_id}
+
+def _rpc_error(code: int, message: str, request_id: Any, data: Any = None) -> Dict[str, Any]:
+    """JSON-RPC 2.0 error envelope (data is included only when given)"""
+    error = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+    return {"jsonrpc": "2.0", "error": error, "id": request_id}
+
+def _invalid_params_error(e: ValidationError, request_id: Any) -> Dict[str, Any]:
+    """JSON-RPC -32602 error naming the first field that failed validation"""
+    error = e.errors()[0]
+    field = ".".join(str(loc) for loc in error["loc"]) or "params"
+    return _rpc_error(-32602, f"Invalid params: {field}: {error['msg']}", request_id)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     # More detailed health check for debugging
     health_status = {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
         "gemini_configured": bool(GEMINI_API_KEY and GEMINI_MODEL),
         "model": GEMINI_MODEL,
         "api_key_loaded": bool(GEMINI_API_KEY),
-        "model_selected": bool(GEMINI_MODEL)
+        "model_selected": bool(GEMINI_MODEL),
+        # Backpressure: async task processors alive vs. how many may wait on Gemini at once
+        "background_tasks": len(_running_processors),
+        "max_concurrency": GEMINI_MAX_CONCURRENCY
     }
     
     # Add warning if not fully configured
@@ -382,8 +831,7 @@ async def test_gemini():
                 "model": None
             }
         
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        response = model.generate_content("Say 'Hello World'")
+        response = await asyncio.to_thread(GEMINI_CLIENT.generate_content, "Say 'Hello World'")
         
         return {
             "success": True,
@@ -398,79 +846,103 @@ async def test_gemini():
             "error_type": type(e).__name__
         }
 
+# Agent card is static - read it once at startup and serve the raw bytes
+# (no file I/O, JSON parse or re-serialization per request)
+AGENT_CARD_BYTES: Optional[bytes] = None
+try:
+    with open(".well-known/agent-card.json", "rb") as f:
+        AGENT_CARD_BYTES = f.read()
+    orjson.loads(AGENT_CARD_BYTES)  # fail fast on a malformed card
+except FileNotFoundError:
+    logger.warning("Agent card not found at .well-known/agent-card.json")
+
 # A2A Discovery endpoint - Agent Card (v0.3.0 compliant)
 @app.get("/.well-known/agent-card.json")
 async def get_agent_card():
     # This will be served by static files, but keeping as fallback
-    try:
-        with open(".well-known/agent-card.json", "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
+    if AGENT_CARD_BYTES is None:
         raise HTTPException(status_code=404, detail="Agent card not found")
+    return Response(AGENT_CARD_BYTES, media_type="application/json")
 
 # Legacy endpoint for backwards compatibility (v0.2.1)
 @app.get("/.well-known/agent.json")
 async def get_agent_card_legacy():
     # Redirect to new endpoint
-    try:
-        with open(".well-known/agent-card.json", "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
+    if AGENT_CARD_BYTES is None:
         raise HTTPException(status_code=404, detail="Agent card not found")
+    return Response(AGENT_CARD_BYTES, media_type="application/json")
 
 # ============================================================================
 # A2A Protocol v0.3.0 Core Methods
 # ============================================================================
 
-def determine_skill_from_message(text: str) -> str:
-    """
-    Determine which skill to invoke based on natural language message content.
-    Uses keyword matching - could be enhanced with LLM-based intent classification.
-    """
-    text_lower = text.lower()
-
-    # Summarization keywords
-    summarization_keywords = [
+# Skill routing keywords, checked in priority order (first skill with any match wins)
+SKILL_KEYWORDS = [
+    ("summarization", [
         "summarize", "summary", "overview", "brief",
         "condense", "key points", "main points", "tldr",
         "give me a", "what are the"
-    ]
-    if any(keyword in text_lower for keyword in summarization_keywords):
-        return "summarization"
-
-    # Sentiment analysis keywords
-    sentiment_keywords = [
+    ]),
+    ("sentiment-analysis", [
         "sentiment", "tone", "emotion", "feeling",
         "positive", "negative", "analyze", "opinion",
         "how do", "what's the feeling"
-    ]
-    if any(keyword in text_lower for keyword in sentiment_keywords):
-        return "sentiment-analysis"
-
-    # Entity extraction keywords
-    extraction_keywords = [
+    ]),
+    ("entity-extraction", [
         "extract", "find", "identify", "entities",
         "names", "people", "organizations", "locations",
         "contacts", "pull out", "what organizations"
-    ]
-    if any(keyword in text_lower for keyword in extraction_keywords):
-        return "entity-extraction"
+    ]),
+]
+
+# One alternation per skill, so each skill costs a single scan of the text
+_SKILL_PATTERNS = [
+    (skill, re.compile("|".join(re.escape(keyword) for keyword in keywords)))
+    for skill, keywords in SKILL_KEYWORDS
+]
+
+# Short messages (the ones that repeat) are memoized; longer ones are matched
+# directly so the cache stays small
+SKILL_CACHE_MAX_TEXT = 256
+
+@functools.lru_cache(maxsize=4096)
+def _match_skill(text_lower: str) -> Optional[str]:
+    """Return the first skill whose keywords occur in the (lowercased) text"""
+    for skill, pattern in _SKILL_PATTERNS:
+        if pattern.search(text_lower):
+            return skill
+    return None
+
+def determine_skill_from_message(text: str) -> str:
+    """
+    Determine which skill to invoke based on natural language message content.
+    Uses keyword matching - could be enhanced with LLM-based intent classification.
+    """
+    text_lower = text.lower()
+
+    if len(text_lower) <= SKILL_CACHE_MAX_TEXT:
+        skill = _match_skill(text_lower)
+    else:
+        skill = _match_skill.__wrapped__(text_lower)
+    if skill:
+        return skill
 
     # Default to summarization if unclear
     logger.info(f"Could not determine skill from: '{text[:50]}...', defaulting to summarization")
     return "summarization"
 
+# Word-limit phrasings, e.g. "in 50 words" / "50 words or less"
+_MAX_LEN_PATTERNS = [
+    re.compile(r'(?:in|maximum|max|up to|under)\s+(\d+)\s+words?'),
+    re.compile(r'(\d+)\s+words?\s+(?:or less|maximum|max)'),
+]
+
 def extract_max_length_from_text(text: str) -> Optional[int]:
     """Extract max_length parameter from natural language if specified"""
-    import re
-
-    patterns = [
-        r'(?:in|maximum|max|up to|under)\s+(\d+)\s+words?',
-        r'(\d+)\s+words?\s+(?:or less|maximum|max)',
-    ]
+    text_lower = text.lower()
 
-    for pattern in patterns:
-        match = re.search(pattern, text.lower())
+    for pattern in _MAX_LEN_PATTERNS:
+        match = pattern.search(text_lower)
         if match:
             return int(match.group(1))
 
@@ -479,7 +951,6 @@ def extract_max_length_from_text(text: str) -> Optional[int]:
 async def handle_message_send(
     params: Dict[str, Any],
     auth: Dict[str, Any],
-    background_tasks: BackgroundTasks,
     request_id: Union[str, int]
 ) -> Dict[str, Any]:
     """
@@ -488,64 +959,56 @@ async def handle_message_send(
     """
     try:
         # Parse and validate params
-        send_params = SendMessageParams(**params)
+        send_params = SendMessageParams.model_validate(params)
         message = send_params.message
-        task_id = send_params.taskId or str(uuid.uuid4())
+        task_id = send_params.taskId or new_task_id()
+        user_name = auth['name']
 
         # Check Gemini configuration
         if not GEMINI_API_KEY or not GEMINI_MODEL:
-            return {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32603,
-                    "message": "Internal error: AI capabilities not configured"
-                },
-                "id": request_id
-            }
+            return _rpc_error(-32603, "Internal error: AI capabilities not configured", request_id)
 
-        # Extract text content from message parts
-        text_content = ""
+        # Extract text content from message parts (pydantic guarantees each part is a dict)
+        text_parts = []
         for part in message.parts:
-            if isinstance(part, dict):
-                part_type = part.get("type")
-                if part_type == "text":
-                    text_content += part.get("text", "") + "\n"
-                elif part_type == "file":
-                    # TODO: Handle file parts (download URI or decode bytes)
-                    logger.warning(f"File part handling not yet implemented")
-                elif part_type == "data":
-                    # TODO: Handle structured data parts
-                    logger.warning(f"Data part handling not yet implemented")
-
-        text_content = text_content.strip()
+            part_type = part.get("type")
+            if part_type == "text":
+                text_parts.append(part.get("text", ""))
+            elif part_type == "file":
+                # TODO: Handle file parts (download URI or decode bytes)
+                logger.warning(f"File part handling not yet implemented")
+            elif part_type == "data":
+                # TODO: Handle structured data parts
+                logger.warning(f"Data part handling not yet implemented")
+
+        text_content = "\n".join(text_parts).strip()
 
         if not text_content:
-            return {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32602,
-                    "message": "Invalid params: No text content found in message"
-                },
-                "id": request_id
-            }
+            return _rpc_error(-32602, "Invalid params: No text content found in message", request_id)
 
         # Determine skill/intent from message
         skill = determine_skill_from_message(text_content)
 
+        # Reject text outside the skill's limits before allocating a task
+        try:
+            SKILL_PARAMS_MODELS[skill].model_validate({"text": text_content})
+        except ValidationError as e:
+            return _invalid_params_error(e, request_id)
+
         # Create task
-        tasks[task_id] = {
+        store_task({
             "task_id": task_id,
             "status": TaskState.PENDING,
             "skill": skill,
             "message": text_content,
-            "created_at": datetime.utcnow().isoformat(),
-            "created_by": auth.get('name', 'Unknown'),
+            "created_at": utc_now_iso(),
+            "created_by": user_name,
             "result": None,
             "error": None,
             "progress": 0
-        }
+        })
 
-        logger.info(f"Task {task_id} created by '{auth.get('name')}' - Skill: {skill} (via message/send)")
+        logger.info(f"Task {task_id} created by '{user_name}' - Skill: {skill} (via message/send)")
 
         # Check mode from authenticated API key (Option 5: API Key-Based Sync Mode)
         api_key_mode = auth.get("mode", "async")
@@ -553,10 +1016,11 @@ async def handle_message_send(
 
         if api_key_mode == "sync":
             # SYNCHRONOUS MODE: Wait for completion
-            logger.info(f"Processing task {task_id} in SYNC mode (timeout={api_key_timeout}s) for client '{auth.get('name', 'unknown')}'")
+            logger.debug("Processing task %s in SYNC mode (timeout=%ss) for client '%s'", task_id, api_key_timeout, user_name)
 
             try:
                 # Wait for task completion with timeout
+                started = time.monotonic()
                 await asyncio.wait_for(
                     process_message_task(task_id),
                     timeout=float(api_key_timeout)
@@ -564,123 +1028,112 @@ async def handle_message_send(
 
                 # Return completed result
                 task_result = tasks[task_id]
-                logger.info(f"Task {task_id} completed synchronously in {task_result.get('processingTime', 0):.2f}s")
+                logger.info(f"Task {task_id} completed synchronously in {time.monotonic() - started:.2f}s")
 
-                return {
-                    "jsonrpc": "2.0",
-                    "result": task_result,
-                    "id": request_id
-                }
+                return _rpc_ok(task_result, request_id)
 
             except asyncio.TimeoutError:
                 # Timeout occurred - task still processing
                 logger.error(f"Task {task_id} timed out after {api_key_timeout}s in sync mode")
 
                 # Mark task as failed
-                tasks[task_id]["status"] = TaskState.FAILED
-                tasks[task_id]["error"] = {
+                update_task(tasks[task_id], status=TaskState.FAILED, error={
                     "code": -32603,
                     "message": f"Request timeout - task exceeded {api_key_timeout}s limit. Task remains processing in background."
-                }
-
-                return {
-                    "jsonrpc": "2.0",
-                    "error": {
-                        "code": -32603,
-                        "message": f"Request timeout - task exceeded {api_key_timeout}s limit",
-                        "data": {
-                            "taskId": task_id,
-                            "timeout": api_key_timeout,
-                            "suggestion": "Consider increasing timeout in API key configuration or using async mode"
-                        }
-                    },
-                    "id": request_id
-                }
+                })
+
+                return _rpc_error(
+                    -32603,
+                    f"Request timeout - task exceeded {api_key_timeout}s limit",
+                    request_id,
+                    data={
+                        "taskId": task_id,
+                        "timeout": api_key_timeout,
+                        "suggestion": "Consider increasing timeout in API key configuration or using async mode"
+                    }
+                )
 
             except Exception as e:
                 # Unexpected error during sync processing
                 logger.error(f"Error in sync processing for task {task_id}: {str(e)}", exc_info=True)
 
-                tasks[task_id]["status"] = TaskState.FAILED
-                tasks[task_id]["error"] = {
+                update_task(tasks[task_id], status=TaskState.FAILED, error={
                     "code": -32603,
                     "message": f"Internal error during sync processing: {str(e)}"
-                }
-
-                return {
-                    "jsonrpc": "2.0",
-                    "error": {
-                        "code": -32603,
-                        "message": f"Internal error during sync processing: {str(e)}",
-                        "data": {"taskId": task_id}
-                    },
-                    "id": request_id
-                }
+                })
+
+                return _rpc_error(
+                    -32603,
+                    f"Internal error during sync processing: {str(e)}",
+                    request_id,
+                    data={"taskId": task_id}
+                )
 
         else:
             # ASYNCHRONOUS MODE: Background processing (current behavior)
-            logger.info(f"Processing task {task_id} in ASYNC mode for client '{auth.get('name', 'unknown')}'")
+            logger.debug("Processing task %s in ASYNC mode for client '%s'", task_id, user_name)
 
-            background_tasks.add_task(process_message_task, task_id)
+            spawn_task_processor(process_message_task(task_id))
 
-            return {
-                "jsonrpc": "2.0",
-                "result": {
-                    "taskId": task_id,
-                    "status": TaskState.PENDING
-                },
-                "id": request_id
-            }
+            return _rpc_ok({"taskId": task_id, "status": TaskState.PENDING}, request_id)
 
     except Exception as e:
         logger.error(f"Error in handle_message_send: {str(e)}")
-        return {
-            "jsonrpc": "2.0",
-            "error": {
-                "code": -32603,
-                "message": f"Internal error: {str(e)}"
-            },
-            "id": request_id
-        }
+        return _rpc_error(-32603, f"Internal error: {str(e)}", request_id)
 
 async def process_message_task(task_id: str):
     """Process message-based task by routing to appropriate skill handler"""
     task = tasks[task_id]
 
     try:
-        task["status"] = TaskState.RUNNING
-        task["progress"] = 10
-
-        skill = task["skill"]
-        text = task["message"]
-
-        # Route to existing handlers (these remain unchanged!)
-        if skill == "summarization":
-            max_length = extract_max_length_from_text(text) or 100
-            result = await handle_text_summarization(
-                {"text": text, "max_length": max_length},
-                task
-            )
-        elif skill == "sentiment-analysis":
-            result = await handle_sentiment_analysis({"text": text}, task)
-        elif skill == "entity-extraction":
-            result = await handle_data_extraction({"text": text}, task)
-        else:
-            raise ValueError(f"Unknown skill: {skill}")
+        # Wait for a Gemini slot - the task stays pending while queued
+        async with _get_gemini_semaphore():
+            update_task(task, status=TaskState.RUNNING, progress=10)
+
+            skill = task["skill"]
+            text = task["message"]
+
+            # Route to existing handlers (these remain unchanged!)
+            if skill == "summarization":
+                max_length = extract_max_length_from_text(text) or 100
+                handler_call = handle_text_summarization(
+                    {"text": text, "max_length": max_length},
+                    task
+                )
+            elif skill == "sentiment-analysis":
+                handler_call = handle_sentiment_analysis({"text": text}, task)
+            elif skill == "entity-extraction":
+                handler_call = handle_data_extraction({"text": text}, task)
+            else:
+                raise ValueError(f"Unknown skill: {skill}")
+
+            result = await asyncio.wait_for(handler_call, timeout=TASK_TIMEOUT)
 
         # Update task with result
-        task["status"] = TaskState.COMPLETED
-        task["progress"] = 100
-        task["result"] = result
-        task["completed_at"] = datetime.utcnow().isoformat()
+        task.pop("partial_result", None)
+        update_task(
+            task,
+            status=TaskState.COMPLETED,
+            progress=100,
+            result=result,
+            completed_at=utc_now_iso()
+        )
 
         logger.info(f"Task {task_id} completed successfully")
 
+    except asyncio.TimeoutError:
+        logger.error(f"Task {task_id} timed out after {TASK_TIMEOUT}s")
+        task.pop("partial_result", None)
+        update_task(task, status=TaskState.FAILED, error=f"Task timed out after {TASK_TIMEOUT}s", failed_at=utc_now_iso())
+    except asyncio.CancelledError:
+        # Don't leave the task stuck in "running" when its processor is cancelled
+        task.pop("partial_result", None)
+        update_task(task, status=TaskState.FAILED, error="Task cancelled", failed_at=utc_now_iso())
+        raise
     except Exception as e:
         logger.error(f"Task {task_id} failed: {str(e)}")
-        task["status"] = TaskState.FAILED
-        task["error"] = str(e)
-        task["failed_at"] = datetime.utcnow().isoformat()
+        task.pop("partial_result", None)
+        update_task(task, status=TaskState.FAILED, error=str(e), failed_at=utc_now_iso())
 
 # ============================================================================
 # A2A Protocol v0.3.0: tasks/list Method
@@ -708,283 +1161,270 @@ async def handle_tasks_list(
 
         # Validate pagination parameters
         if page < 1:
-            return {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32602,
-                    "message": "Invalid params: page must be >= 1"
-                },
-                "id": request_id
-            }
+            return _rpc_error(-32602, "Invalid params: page must be >= 1", request_id)
 
         if limit < 1 or limit > 100:
-            return {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32602,
-                    "message": "Invalid params: limit must be between 1 and 100"
-                },
-                "id": request_id
-            }
+            return _rpc_error(-32602, "Invalid params: limit must be between 1 and 100", request_id)
 
         # Get user's API key name for filtering
-        user_name = auth.get('name', 'Unknown')
-
-        # Filter tasks by user (only show tasks created by this user)
-        user_tasks = [
-            task for task in tasks.values()
-            if task.get("created_by") == user_name
-        ]
-
-        # Apply status filter if provided
-        if status_filter:
-            user_tasks = [
-                task for task in user_tasks
-                if task.get("status") == status_filter
-            ]
-
-        # Apply skill filter if provided
-        if skill_filter:
-            user_tasks = [
-                task for task in user_tasks
-                if task.get("skill") == skill_filter or task.get("method") == skill_filter
-            ]
-
-        # Sort by creation time (newest first)
-        user_tasks.sort(
-            key=lambda t: t.get("created_at", ""),
-            reverse=True
-        )
+        user_name = auth['name']
 
-        # Calculate pagination
-        total_tasks = len(user_tasks)
-        total_pages = (total_tasks + limit - 1) // limit  # Ceiling division
+        # Walk only this user's tasks, newest first (the owner index is in
+        # creation order, so no sort is needed). Only the requested page is
+        # collected; the remaining matches are just counted.
         start_idx = (page - 1) * limit
         end_idx = start_idx + limit
+        owner_ids = _task_ids_by_owner.get(user_name, {})
+        paginated_tasks = []
+        total_tasks = 0
+        stale_ids = []
+        for task_id in reversed(owner_ids):
+            task = tasks.get(task_id)
+            if task is None or task.get("created_by") != user_name:
+                stale_ids.append(task_id)
+                continue
+
+            # Apply status/skill filters if provided
+            if status_filter and task.get("status") != status_filter:
+                continue
+            if skill_filter and task.get("skill") != skill_filter and task.get("method") != skill_filter:
+                continue
+
+            if start_idx <= total_tasks < end_idx:
+                paginated_tasks.append(task)
+            total_tasks += 1
+
+        for task_id in stale_ids:
+            del owner_ids[task_id]
 
-        # Get paginated slice
-        paginated_tasks = user_tasks[start_idx:end_idx]
+        # Calculate pagination
+        total_pages = (total_tasks + limit - 1) // limit  # Ceiling division
 
         # Build response
-        return {
-            "jsonrpc": "2.0",
-            "result": {
-                "tasks": paginated_tasks,
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "totalTasks": total_tasks,
-                    "totalPages": total_pages,
-                    "hasNextPage": page < total_pages,
-                    "hasPreviousPage": page > 1
-                },
-                "filters": {
-                    "status": status_filter,
-                    "skill": skill_filter
-                }
+        return _rpc_ok({
+            "tasks": paginated_tasks,
+            "pagination": {
+                "page": page,
+                "limit": limit,
+                "totalTasks": total_tasks,
+                "totalPages": total_pages,
+                "hasNextPage": page < total_pages,
+                "hasPreviousPage": page > 1
             },
-            "id": request_id
-        }
+            "filters": {
+                "status": status_filter,
+                "skill": skill_filter
+            }
+        }, request_id)
 
     except Exception as e:
         logger.error(f"Error in handle_tasks_list: {str(e)}")
-        return {
-            "jsonrpc": "2.0",
-            "error": {
-                "code": -32603,
-                "message": f"Internal error: {str(e)}"
-            },
-            "id": request_id
-        }
+        return _rpc_error(-32603, f"Internal error: {str(e)}", request_id)
 
 # ============================================================================
 # JSON-RPC 2.0 Processing Logic (Shared by Root and Legacy Endpoints)
 # ============================================================================
 
+async def handle_tasks_get(
+    params: Dict[str, Any],
+    auth: Dict[str, Any],
+    request_id: Union[str, int]
+) -> Dict[str, Any]:
+    """Handle tasks/get RPC method (same data as the /tasks/{task_id} endpoint)"""
+    task_id = params.get("taskId")
+    if not task_id or task_id not in tasks:
+        return _rpc_error(-32602, "Invalid taskId", request_id)
+    return _rpc_ok(tasks[task_id], request_id)
+
+async def handle_legacy_method(
+    method: str,
+    params: Dict[str, Any],
+    auth: Dict[str, Any],
+    request_id: Union[str, int]
+) -> Dict[str, Any]:
+    """Handle the deprecated custom methods (text.summarize, text.analyze_sentiment, data.extract)"""
+    logger.warning(f"⚠️  Using deprecated method '{method}'. Consider using 'message/send' per A2A v0.3.0")
+
+    # Reject invalid params before allocating a task
+    try:
+        LEGACY_PARAMS_MODELS[method].model_validate(params)
+    except ValidationError as e:
+        return _invalid_params_error(e, request_id)
+
+    # Check if Gemini is configured
+    if not GEMINI_API_KEY or not GEMINI_MODEL:
+        return _rpc_error(-32603, "Internal error: AI capabilities not configured", request_id)
+
+    task_id = request_id or new_task_id()
+
+    # Initialize legacy task
+    store_task({
+        "task_id": task_id,
+        "status": "pending",
+        "method": method,
+        "params": params,
+        "created_at": utc_now_iso(),
+        "created_by": auth['name'],
+        "result": None,
+        "error": None,
+        "progress": 0
+    })
+
+    logger.info(f"Task {task_id} created by '{auth['name']}' - Method: {method} (LEGACY)")
+
+    # Check mode from authenticated API key (Option 5: API Key-Based Sync Mode)
+    api_key_mode = auth.get("mode", "async")
+    api_key_timeout = auth.get("timeout", 60)
+
+    if api_key_mode == "sync":
+        # SYNCHRONOUS MODE: Wait for completion (legacy method)
+        logger.debug("Processing legacy task %s in SYNC mode (timeout=%ss)", task_id, api_key_timeout)
+
+        try:
+            started = time.monotonic()
+            await asyncio.wait_for(
+                process_task(task_id),
+                timeout=float(api_key_timeout)
+            )
+
+            # Return completed result
+            task_result = tasks[task_id]
+            logger.info(f"Legacy task {task_id} completed synchronously in {time.monotonic() - started:.2f}s")
+
+            return _rpc_ok(task_result, request_id)
+
+        except asyncio.TimeoutError:
+            logger.error(f"Legacy task {task_id} timed out after {api_key_timeout}s")
+            update_task(tasks[task_id], status="failed", error=f"Timeout after {api_key_timeout}s")
+
+            return _rpc_error(
+                -32603,
+                f"Legacy method timeout after {api_key_timeout}s",
+                request_id,
+                data={"task_id": task_id}
+            )
+
+        except Exception as e:
+            logger.error(f"Error in sync processing for legacy task {task_id}: {str(e)}")
+            update_task(tasks[task_id], status="failed", error=str(e))
+
+            return _rpc_error(
+                -32603,
+                f"Error during sync processing: {str(e)}",
+                request_id,
+                data={"task_id": task_id}
+            )
+
+    else:
+        # ASYNCHRONOUS MODE: Background processing (legacy)
+        logger.debug("Processing legacy task %s in ASYNC mode", task_id)
+
+        spawn_task_processor(process_task(task_id))
+
+        return _rpc_ok({"task_id": task_id, "status": "pending"}, request_id)
+
+# JSON-RPC method -> handler(params, auth, request_id); one dict lookup per request
+RPC_METHODS: Dict[str, Callable] = {
+    "message/send": handle_message_send,
+    "tasks/get": handle_tasks_get,
+    "tasks/list": handle_tasks_list,
+    **{m: functools.partial(handle_legacy_method, m) for m in LEGACY_METHODS},
+}
+
+# Upper bound on a JSON-RPC request body; larger payloads are rejected unparsed
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(1024 * 1024)))
+
+def _request_too_large_error() -> Dict[str, Any]:
+    """JSON-RPC error for a request body over MAX_REQUEST_BYTES"""
+    return _rpc_error(-32600, f"Invalid Request: body exceeds {MAX_REQUEST_BYTES} bytes", None)
+
+async def _dispatch_rpc(body: Any, auth: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate one JSON-RPC request object and route it to its method handler"""
+    # The envelope is checked by hand (JsonRpcRequest is documentation only)
+    # so valid calls skip a Pydantic pass
+    if not isinstance(body, dict):
+        return _rpc_error(-32600, "Invalid Request: expected a JSON object", None)
+    method = body.get("method")
+    params = body.get("params")
+    request_id = body.get("id")
+    if not isinstance(method, str):
+        return _rpc_error(-32600, "Invalid Request: method must be a string", request_id)
+    if params is None:
+        params = {}
+    elif not isinstance(params, dict):
+        return _rpc_error(-32602, "Invalid params: params must be an object", request_id)
+
+    # Route to A2A Protocol v0.3.0 or legacy method handler
+    handler = RPC_METHODS.get(method)
+    if handler is None:
+        return _rpc_error(-32601, f"Method not found: {method}", request_id)
+    try:
+        return await handler(params, auth, request_id)
+    except Exception as e:
+        logger.error(f"RPC error: {str(e)}")
+        return _rpc_error(-32603, f"Internal error: {str(e)}", request_id)
+
 async def _process_rpc_request(
     request: Request,
-    background_tasks: BackgroundTasks,
     auth: Dict[str, Any]
-) -> Dict[str, Any]:
+) -> Union[Dict[str, Any], List[Dict[str, Any]], None]:
     """
     Core RPC request processing logic shared by both endpoints.
 
     Supports:
     - A2A Protocol v0.3.0 methods (message/send, tasks/list, tasks/get)
     - Legacy custom methods (text.summarize, text.analyze_sentiment, data.extract)
+    - JSON-RPC 2.0 batches: an array of requests is dispatched concurrently and
+      answered with an array of responses (notifications - requests without
+      an "id" - get no response)
 
     Args:
         request: FastAPI Request object
-        background_tasks: FastAPI BackgroundTasks for async processing
         auth: Authentication dictionary from verify_token
 
     Returns:
-        JSON-RPC 2.0 response dictionary
+        JSON-RPC 2.0 response dictionary, a list of them for a batch, or None
+        for a batch made up only of notifications
     """
     # Log endpoint usage for monitoring
     endpoint_path = request.url.path
-    logger.info(f"RPC request via {endpoint_path} from '{auth.get('name', 'Unknown')}'")
+    logger.debug("RPC request via %s from '%s'", endpoint_path, auth['name'])
 
     try:
-        # Parse JSON-RPC request
-        body = await request.json()
-        method = body.get("method")
-        params = body.get("params", {})
-        request_id = body.get("id")
-
-        # Route to A2A Protocol v0.3.0 methods
-        if method == "message/send":
-            return await handle_message_send(params, auth, background_tasks, request_id)
-
-        elif method == "tasks/get":
-            # Implemented by /tasks/{task_id} endpoint but also available via RPC
-            task_id = params.get("taskId")
-            if not task_id or task_id not in tasks:
-                return {
-                    "jsonrpc": "2.0",
-                    "error": {"code": -32602, "message": "Invalid taskId"},
-                    "id": request_id
-                }
-            return {
-                "jsonrpc": "2.0",
-                "result": tasks[task_id],
-                "id": request_id
-            }
-
-        elif method == "tasks/list":
-            # A2A Protocol v0.3.0: List paginated tasks for authenticated user
-            return await handle_tasks_list(params, auth, request_id)
-
-        # Legacy custom methods (backwards compatibility)
-        elif method in ["text.summarize", "text.analyze_sentiment", "data.extract"]:
-            logger.warning(f"⚠️  Using deprecated method '{method}'. Consider using 'message/send' per A2A v0.3.0")
-
-            # Check if Gemini is configured
-            if not GEMINI_API_KEY or not GEMINI_MODEL:
-                return {
-                    "jsonrpc": "2.0",
-                    "error": {
-                        "code": -32603,
-                        "message": "Internal error: AI capabilities not configured"
-                    },
-                    "id": request_id
-                }
-
-            task_id = request_id or str(uuid.uuid4())
-
-            # Initialize legacy task
-            tasks[task_id] = {
-                "task_id": task_id,
-                "status": "pending",
-                "method": method,
-                "params": params,
-                "created_at": datetime.utcnow().isoformat(),
-                "created_by": auth.get('name', 'Unknown'),
-                "result": None,
-                "error": None,
-                "progress": 0
-            }
-
-            logger.info(f"Task {task_id} created by '{auth.get('name')}' - Method: {method} (LEGACY)")
-
-            # Check mode from authenticated API key (Option 5: API Key-Based Sync Mode)
-            api_key_mode = auth.get("mode", "async")
-            api_key_timeout = auth.get("timeout", 60)
-
-            if api_key_mode == "sync":
-                # SYNCHRONOUS MODE: Wait for completion (legacy method)
-                logger.info(f"Processing legacy task {task_id} in SYNC mode (timeout={api_key_timeout}s)")
-
-                try:
-                    await asyncio.wait_for(
-                        process_task(task_id),
-                        timeout=float(api_key_timeout)
-                    )
-
-                    # Return completed result
-                    task_result = tasks[task_id]
-                    logger.info(f"Legacy task {task_id} completed synchronously")
-
-                    return {
-                        "jsonrpc": "2.0",
-                        "result": task_result,
-                        "id": request_id
-                    }
-
-                except asyncio.TimeoutError:
-                    logger.error(f"Legacy task {task_id} timed out after {api_key_timeout}s")
-                    tasks[task_id]["status"] = "failed"
-                    tasks[task_id]["error"] = f"Timeout after {api_key_timeout}s"
-
-                    return {
-                        "jsonrpc": "2.0",
-                        "error": {
-                            "code": -32603,
-                            "message": f"Legacy method timeout after {api_key_timeout}s",
-                            "data": {"task_id": task_id}
-                        },
-                        "id": request_id
-                    }
-
-                except Exception as e:
-                    logger.error(f"Error in sync processing for legacy task {task_id}: {str(e)}")
-                    tasks[task_id]["status"] = "failed"
-                    tasks[task_id]["error"] = str(e)
-
-                    return {
-                        "jsonrpc": "2.0",
-                        "error": {
-                            "code": -32603,
-                            "message": f"Error during sync processing: {str(e)}",
-                            "data": {"task_id": task_id}
-                        },
-                        "id": request_id
-                    }
-
-            else:
-                # ASYNCHRONOUS MODE: Background processing (legacy)
-                logger.info(f"Processing legacy task {task_id} in ASYNC mode")
-
-                background_tasks.add_task(process_task, task_id)
-
-                return {
-                    "jsonrpc": "2.0",
-                    "result": {
-                        "task_id": task_id,
-                        "status": "pending"
-                    },
-                    "id": request_id
-                }
-
-        else:
-            return {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32601,
-                    "message": f"Method not found: {method}"
-                },
-                "id": request_id
-            }
-
-    except json.JSONDecodeError:
-        return {
-            "jsonrpc": "2.0",
-            "error": {
-                "code": -32700,
-                "message": "Parse error: Invalid JSON"
-            },
-            "id": None
-        }
+        # Reject oversized payloads before reading/decoding them
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+            return _request_too_large_error()
+
+        raw_body = await request.body()
+        if len(raw_body) > MAX_REQUEST_BYTES:
+            return _request_too_large_error()
+
+        body = orjson.loads(raw_body)
+    except orjson.JSONDecodeError:
+        return _rpc_error(-32700, "Parse error: Invalid JSON", None)
     except Exception as e:
         logger.error(f"RPC error: {str(e)}")
-        return {
-            "jsonrpc": "2.0",
-            "error": {
-                "code": -32603,
-                "message": f"Internal error: {str(e)}"
-            },
-            "id": body.get("id") if 'body' in locals() else None
-        }
+        return _rpc_error(-32603, f"Internal error: {str(e)}", None)
+
+    if not isinstance(body, list):
+        return await _dispatch_rpc(body, auth)
+
+    # Batch request: one round trip, siblings run concurrently
+    if not body:
+        return _rpc_error(-32600, "Invalid Request: empty batch", None)
+    responses = await asyncio.gather(*(_dispatch_rpc(item, auth) for item in body))
+    responses = [
+        response for item, response in zip(body, responses)
+        if not (isinstance(item, dict) and "id" not in item)
+    ]
+    return responses or None
+
+def _rpc_response(payload: Union[Dict[str, Any], List[Dict[str, Any]], None]) -> Response:
+    """HTTP response for a processed JSON-RPC payload (204 when there is nothing to return)"""
+    if payload is None:
+        return Response(status_code=204)
+    return ORJSONResponse(payload)
 
 # ============================================================================
 # JSON-RPC 2.0 Endpoints (Root + Legacy for Backwards Compatibility)
@@ -993,7 +1433,6 @@ async def _process_rpc_request(
 @app.post("/")
 async def handle_rpc_request_root(
     request: Request,
-    background_tasks: BackgroundTasks,
     auth: Dict[str, Any] = Depends(verify_token)
 ):
     """
@@ -1004,15 +1443,15 @@ async def handle_rpc_request_root(
     Supports:
     - A2A Protocol v0.3.0 methods: message/send, tasks/list, tasks/get
     - Legacy methods: text.summarize, text.analyze_sentiment, data.extract
+    - JSON-RPC 2.0 batch requests (array of request objects)
 
     See: https://agent2agent.ai/protocol
     """
-    return await _process_rpc_request(request, background_tasks, auth)
+    return _rpc_response(await _process_rpc_request(request, auth))
 
 @app.post("/rpc")
 async def handle_rpc_request_legacy(
     request: Request,
-    background_tasks: BackgroundTasks,
     auth: Dict[str, Any] = Depends(verify_token)
 ):
     """
@@ -1025,7 +1464,7 @@ async def handle_rpc_request_legacy(
     - A2A Protocol v0.3.0 methods: message/send, tasks/list, tasks/get
     - Legacy methods: text.summarize, text.analyze_sentiment, data.extract
     """
-    return await _process_rpc_request(request, background_tasks, auth)
+    return _rpc_response(await _process_rpc_request(request, auth))
 
 # Task status endpoint
 @app.get("/tasks/{task_id}")
@@ -1033,10 +1472,19 @@ async def get_task_status(
     task_id: str,
     auth: Dict[str, Any] = Depends(verify_token)
 ):
-    if task_id not in tasks:
+    task = tasks.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    return TaskStatus(**tasks[task_id])
+    # Task records are built by this service, so project the TaskStatus fields
+    # directly instead of re-validating them on every poll
+    return ORJSONResponse({field: task.get(field) for field in TASK_STATUS_FIELDS})
+
+# SSE status frames carry only what subscribers track, not the task's inputs
+SSE_FRAME_FIELDS = ("task_id", "status", "progress", "result", "error")
+
+# Idle SSE streams get a comment frame this often so proxies don't drop them
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "30"))
 
 # Server-Sent Events for real-time updates
 @app.get("/tasks/{task_id}/stream")
@@ -1048,16 +1496,55 @@ async def stream_task_updates(
         raise HTTPException(status_code=404, detail="Task not found")
 
     async def event_stream():
-        while True:
-            if task_id in tasks:
-                task = tasks[task_id]
-                data = json.dumps(task)
-                yield f"data: {data}\n\n"
+        last_data = None
+        sent_len = 0
 
-                if task["status"] in ["completed", "failed"]:
+        try:
+            while True:
+                # Register for the next update before taking the snapshot, so an
+                # update made while the frames below are being written still wakes
+                # the wait at the end of this iteration
+                update_event = task_events.setdefault(task_id, asyncio.Event())
+
+                task = tasks.get(task_id)
+                if task is None:
+                    # Task expired or was evicted from the store
                     break
 
-            await asyncio.sleep(1)
+                # Snapshot everything this iteration sends before the first yield
+                partial = task.get("partial_result") or ""
+                status = task["status"]
+                data = orjson.dumps({k: task[k] for k in SSE_FRAME_FIELDS if k in task}).decode()
+
+                # Stream newly generated text as "delta" events
+                if len(partial) > sent_len:
+                    delta = orjson.dumps({"task_id": task_id, "delta": partial[sent_len:]}).decode()
+                    sent_len = len(partial)
+                    yield f"event: delta\ndata: {delta}\n\n"
+
+                if data != last_data:
+                    last_data = data
+                    yield f"data: {data}\n\n"
+
+                # Decide on the snapshot, so the frame carrying the final status
+                # and result has always been sent before the stream ends
+                if status in TERMINAL_TASK_STATES:
+                    break
+
+                # Sleep until the task reports an update (no polling)
+                try:
+                    await asyncio.wait_for(update_event.wait(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            # A finished (or vanished) task is never updated again, so nothing
+            # would pop the event registered above - drop it here, whether the
+            # stream ended normally or the client disconnected. For a live task
+            # the entry is left for the next update_task to pop and set, since
+            # other subscribers may be waiting on it.
+            task = tasks.get(task_id)
+            if task is None or task["status"] in TERMINAL_TASK_STATES:
+                task_events.pop(task_id, None)
 
     return StreamingResponse(event_stream(), media_type="text/event-stream")
 
@@ -1067,34 +1554,238 @@ async def process_task(task_id: str):
     task = tasks[task_id]
 
     try:
-        # Update status to running
-        task["status"] = "running"
-        task["progress"] = 10
-
-        method = task["method"]
-        params = task["params"]
-
-        # Route to appropriate capability handler
-        if method == "text.summarize":
-            result = await handle_text_summarization(params, task)
-        elif method == "text.analyze_sentiment":
-            result = await handle_sentiment_analysis(params, task)
-        elif method == "data.extract":
-            result = await handle_data_extraction(params, task)
-        else:
-            raise ValueError(f"Unsupported method: {method}")
+        # Wait for a Gemini slot - the task stays pending while queued
+        async with _get_gemini_semaphore():
+            # Update status to running
+            update_task(task, status="running", progress=10)
+
+            method = task["method"]
+            params = task["params"]
+
+            # Route to appropriate capability handler
+            if method == "text.summarize":
+                handler_call = handle_text_summarization(params, task)
+            elif method == "text.analyze_sentiment":
+                handler_call = handle_sentiment_analysis(params, task)
+            elif method == "data.extract":
+                handler_call = handle_data_extraction(params, task)
+            else:
+                raise ValueError(f"Unsupported method: {method}")
+
+            result = await asyncio.wait_for(handler_call, timeout=TASK_TIMEOUT)
 
         # Update task with result
-        task["status"] = "completed"
-        task["progress"] = 100
-        task["result"] = result
-        task["completed_at"] = datetime.utcnow().isoformat()
+        task.pop("partial_result", None)
+        update_task(
+            task,
+            status="completed",
+            progress=100,
+            result=result,
+            completed_at=utc_now_iso()
+        )
 
+    except asyncio.TimeoutError:
+        logger.error(f"Task {task_id} timed out after {TASK_TIMEOUT}s")
+        task.pop("partial_result", None)
+        update_task(task, status="failed", error=f"Task timed out after {TASK_TIMEOUT}s", failed_at=utc_now_iso())
+    except asyncio.CancelledError:
+        # Don't leave the task stuck in "running" when its processor is cancelled
+        task.pop("partial_result", None)
+        update_task(task, status="failed", error="Task cancelled", failed_at=utc_now_iso())
+        raise
     except Exception as e:
         logger.error(f"Task {task_id} failed: {str(e)}")
-        task["status"] = "failed"
-        task["error"] = str(e)
-        task["failed_at"] = datetime.utcnow().isoformat()
+        task.pop("partial_result", None)
+        update_task(task, status="failed", error=str(e), failed_at=utc_now_iso())
+
+# ============================================================================
+# Gemini Prompts and Context Caching
+# ============================================================================
+
+# Fixed instruction blocks; the user text is appended as "Text: ..."
+SENTIMENT_INSTRUCTIONS = """Analyze the sentiment of the following text and respond with ONLY a JSON object in this exact format:
+{
+    "sentiment": "positive" or "negative" or "neutral",
+    "confidence": a number between 0 and 1,
+    "scores": {
+        "positive": a number between 0 and 1,
+        "negative": a number between 0 and 1,
+        "neutral": a number between 0 and 1
+    }
+}"""
+
+EXTRACTION_INSTRUCTIONS = """Extract entities from the following text and return ONLY valid JSON.
+
+Return a JSON object with these keys (use empty arrays if no entities found):
+- persons: array of {"name": "...", "salience": 0.0-1.0}
+- locations: array of {"name": "...", "salience": 0.0-1.0}
+- organizations: array of {"name": "...", "salience": 0.0-1.0}
+- dates: array of {"name": "...", "salience": 0.0-1.0}
+- events: array of {"name": "...", "salience": 0.0-1.0}
+- phones: array of {"name": "...", "salience": 0.0-1.0}
+- emails: array of {"name": "...", "salience": 0.0-1.0}
+
+Example response format:
+{
+  "persons": [{"name": "John Doe", "salience": 0.9}],
+  "locations": [{"name": "New York", "salience": 0.7}],
+  "organizations": [],
+  "dates": [],
+  "events": [],
+  "phones": [],
+  "emails": []
+}
+
+Important: Return ONLY the JSON object, no markdown, no explanation, no code blocks."""
+
+# Response schemas for Gemini JSON mode: with response_mime_type=application/json
+# the model returns bare JSON matching the schema, so no fence stripping is needed
+class SentimentScores(BaseModel):
+    positive: float
+    negative: float
+    neutral: float
+
+class SentimentResult(BaseModel):
+    sentiment: Literal["positive", "negative", "neutral"]
+    confidence: float
+    scores: SentimentScores
+
+class ExtractedEntity(BaseModel):
+    name: str
+    salience: float
+
+class ExtractionResult(BaseModel):
+    persons: List[ExtractedEntity]
+    locations: List[ExtractedEntity]
+    organizations: List[ExtractedEntity]
+    dates: List[ExtractedEntity]
+    events: List[ExtractedEntity]
+    phones: List[ExtractedEntity]
+    emails: List[ExtractedEntity]
+
+SENTIMENT_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": SentimentResult}
+EXTRACTION_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": ExtractionResult}
+
+# Prompt prefixes are built once; handlers only append the user text
+SUMMARIZE_PROMPT_TEMPLATE = "Summarize the following text in approximately {max_length} words or less:\n\n"
+TEXT_PREFIX = "Text: "
+SENTIMENT_PROMPT_PREFIX = SENTIMENT_INSTRUCTIONS + "\n\n" + TEXT_PREFIX
+EXTRACTION_PROMPT_PREFIX = EXTRACTION_INSTRUCTIONS + "\n\n" + TEXT_PREFIX
+
+# Optional Gemini context caching: upload each fixed instruction block once as a
+# CachedContent and send only the user text per request. Gemini enforces a minimum
+# cacheable token count per model (1024+ tokens); the current instruction blocks are
+# only ~300 tokens, so creation is rejected and handlers fall back to sending the
+# full prompt. This only takes effect once the instruction blocks grow past it.
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+_context_caches: Dict[str, Any] = {}          # method -> CachedContent
+_context_cached_models: Dict[str, Any] = {}   # method -> GenerativeModel bound to the cache
+_context_cache_refresher: Optional[asyncio.Task] = None
+
+def create_context_caches():
+    """Create one CachedContent per skill with a fixed instruction block (blocking)"""
+    from google.generativeai import caching
+
+    for method, instructions in (
+        ("text.analyze_sentiment", SENTIMENT_INSTRUCTIONS),
+        ("data.extract", EXTRACTION_INSTRUCTIONS),
+    ):
+        try:
+            cache = caching.CachedContent.create(
+                model=f"models/{GEMINI_MODEL}",
+                display_name=f"a2a-{method}",
+                system_instruction=instructions,
+                ttl=timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL)
+            )
+            _context_caches[method] = cache
+            _context_cached_models[method] = genai.GenerativeModel.from_cached_content(cached_content=cache)
+            logger.info(f"✓ Created Gemini context cache for {method}: {cache.name}")
+        except Exception as e:
+            logger.warning(f"Gemini context caching unavailable for {method}, sending full prompts: {e}")
+
+async def refresh_context_caches():
+    """Extend context cache TTLs before they expire; drop caches that cannot be refreshed"""
+    while _context_caches:
+        await asyncio.sleep(GEMINI_CONTEXT_CACHE_TTL / 2)
+
+        for method, cache in list(_context_caches.items()):
+            try:
+                await asyncio.to_thread(cache.update, ttl=timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL))
+            except Exception as e:
+                logger.warning(f"Failed to refresh Gemini context cache for {method}, sending full prompts: {e}")
+                _context_caches.pop(method, None)
+                _context_cached_models.pop(method, None)
+
+# Optional chunked extraction: inputs longer than EXTRACTION_CHUNK_CHARS are split
+# on sentence boundaries and the chunks are extracted by parallel Gemini calls
+# (as many as GEMINI_MAX_CONCURRENCY has free slots for).
+# Disabled when 0 (entities spanning a chunk boundary may be missed).
+EXTRACTION_CHUNK_CHARS = int(os.getenv("EXTRACTION_CHUNK_CHARS", "0"))
+
+def split_text_chunks(text: str, max_chars: int) -> List[str]:
+    """Split text into chunks of at most max_chars, cutting after a '. ' where possible"""
+    chunks = []
+    start = 0
+    while len(text) - start > max_chars:
+        cut = text.rfind(". ", start, start + max_chars)
+        end = cut + 1 if cut > start else start + max_chars
+        chunks.append(text[start:end])
+        start = end
+    chunks.append(text[start:])
+    return [chunk for chunk in chunks if chunk.strip()]
+
+async def generate_chunked(method: str, prompts: List[str], **kwargs) -> List[str]:
+    """
+    Run generate_text for several prompts within the Gemini concurrency budget.
+
+    The caller already holds one GEMINI_MAX_CONCURRENCY slot (task processors
+    run handlers inside the semaphore), which covers the first call. Extra
+    parallel calls only use slots that are free right now, never waiting for
+    one, so chunked tasks can't deadlock each other; the remaining prompts
+    queue behind the calls already running.
+    """
+    semaphore = _get_gemini_semaphore()
+    extra_slots = 0
+    while extra_slots < len(prompts) - 1 and not semaphore.locked():
+        await semaphore.acquire()  # a slot is free, so this doesn't wait
+        extra_slots += 1
+
+    results: List[Optional[str]] = [None] * len(prompts)
+    pending = list(range(len(prompts)))
+
+    async def worker():
+        while pending:
+            index = pending.pop(0)
+            results[index] = await generate_text(method, prompts[index], **kwargs)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(1 + extra_slots)))
+    finally:
+        for _ in range(extra_slots):
+            semaphore.release()
+    return results
+
+def merge_extractions(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-chunk extraction results, keeping each entity once with its highest salience"""
+    merged: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for result in results:
+        for entity_type, entities in result.items():
+            if not isinstance(entities, list):
+                continue
+            by_name = merged.setdefault(entity_type, {})
+            for entity in entities:
+                if not isinstance(entity, dict):
+                    continue
+                existing = by_name.get(entity.get("name"))
+                if existing is None or entity.get("salience", 0) > existing.get("salience", 0):
+                    by_name[entity.get("name")] = entity
+    return {entity_type: list(by_name.values()) for entity_type, by_name in merged.items()}
+
+# Regex fallback for extraction when Gemini's response cannot be parsed
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+_PHONE_RE = re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b')
 
 # Capability handlers using Gemini API
 async def handle_text_summarization(params: Dict[str, Any], task: Dict = None) -> Dict[str, Any]:
@@ -1108,31 +1799,35 @@ async def handle_text_summarization(params: Dict[str, Any], task: Dict = None) -
     if len(text) < 10:
         raise ValueError("Text must be at least 10 characters long")
 
+    if len(text) > 50000:
+        raise ValueError("Text must be 50000 characters or less")
+
     try:
         if task:
-            task["progress"] = 30
+            update_task(task, progress=30)
         
-        # Initialize Gemini model - using cached configuration
-        model = genai.GenerativeModel(GEMINI_MODEL)
-
         # Create prompt
-        prompt = f"""Summarize the following text in approximately {max_length} words or less:
-
-{text}"""
+        prompt = SUMMARIZE_PROMPT_TEMPLATE.format(max_length=max_length) + text
 
         if task:
-            task["progress"] = 50
+            update_task(task, progress=50)
         
-        # Generate summary with timeout
-        response = await asyncio.wait_for(
-            asyncio.to_thread(model.generate_content, prompt),
+        # Expose the summary to SSE subscribers as it is generated
+        on_chunk = None
+        if task:
+            def on_chunk(chunk_text: str):
+                update_task(task, partial_result=task.get("partial_result", "") + chunk_text)
+
+        # Generate summary with timeout (repeated prompts are served from cache)
+        raw = await asyncio.wait_for(
+            generate_text("text.summarize", prompt, on_chunk),
             timeout=30.0
         )
         
-        summary = response.text.strip()
+        summary = raw.strip()
 
         if task:
-            task["progress"] = 90
+            update_task(task, progress=90)
 
         return {
             "summary": summary,
@@ -1162,54 +1857,45 @@ async def handle_sentiment_analysis(params: Dict[str, Any], task: Dict = None) -
 
     try:
         if task:
-            task["progress"] = 30
+            update_task(task, progress=30)
         
-        # Initialize Gemini model with correct name
-        model = genai.GenerativeModel(GEMINI_MODEL)
-
-        # Create prompt for structured sentiment analysis
-        prompt = f"""Analyze the sentiment of the following text and respond with ONLY a JSON object in this exact format:
-{{
-    "sentiment": "positive" or "negative" or "neutral",
-    "confidence": a number between 0 and 1,
-    "scores": {{
-        "positive": a number between 0 and 1,
-        "negative": a number between 0 and 1,
-        "neutral": a number between 0 and 1
-    }}
-}}
-
-Text: {text}"""
+        # Create prompt for structured sentiment analysis (instructions live in the
+        # context cache when one is available)
+        cached_model = _context_cached_models.get("text.analyze_sentiment")
+        if cached_model:
+            prompt = TEXT_PREFIX + text
+        else:
+            prompt = SENTIMENT_PROMPT_PREFIX + text
 
         if task:
-            task["progress"] = 50
-
-        # Generate analysis with timeout
-        response = await asyncio.wait_for(
-            asyncio.to_thread(model.generate_content, prompt),
+            update_task(task, progress=50)
+
+        # Generate analysis with timeout (repeated prompts are served from cache)
+        raw = await asyncio.wait_for(
+            generate_text(
+                "text.analyze_sentiment", prompt,
+                model=cached_model, generation_config=SENTIMENT_GENERATION_CONFIG
+            ),
             timeout=30.0
         )
         
-        result_text = response.text.strip()
+        result_text = raw.strip()
 
         if task:
-            task["progress"] = 70
-
-        # Clean up JSON response (remove markdown code blocks if present)
-        result_text = result_text.replace('```json', '').replace('```', '').strip()
+            update_task(task, progress=70)
 
-        # Parse JSON response
-        result = json.loads(result_text)
+        # Parse JSON response (JSON mode returns the object without fences)
+        result = orjson.loads(result_text)
         result["model_used"] = GEMINI_MODEL
 
         if task:
-            task["progress"] = 90
+            update_task(task, progress=90)
 
         return result
 
     except asyncio.TimeoutError:
         raise ValueError("Request timed out after 30 seconds")
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"Failed to parse JSON response: {result_text}")
         raise ValueError(f"Failed to parse sentiment analysis response: {str(e)}")
     except Exception as e:
@@ -1229,71 +1915,49 @@ async def handle_data_extraction(params: Dict[str, Any], task: Dict = None) -> D
 
     try:
         if task:
-            task["progress"] = 30
+            update_task(task, progress=30)
         
-        # Initialize Gemini model with correct name
-        model = genai.GenerativeModel(GEMINI_MODEL)
-
-        # More explicit prompt for valid JSON
-        prompt = f"""Extract entities from the following text and return ONLY valid JSON.
-
-Text: {text}
-
-Return a JSON object with these keys (use empty arrays if no entities found):
-- persons: array of {{"name": "...", "salience": 0.0-1.0}}
-- locations: array of {{"name": "...", "salience": 0.0-1.0}}
-- organizations: array of {{"name": "...", "salience": 0.0-1.0}}
-- dates: array of {{"name": "...", "salience": 0.0-1.0}}
-- events: array of {{"name": "...", "salience": 0.0-1.0}}
-- phones: array of {{"name": "...", "salience": 0.0-1.0}}
-- emails: array of {{"name": "...", "salience": 0.0-1.0}}
-
-Example response format:
-{{
-  "persons": [{{"name": "John Doe", "salience": 0.9}}],
-  "locations": [{{"name": "New York", "salience": 0.7}}],
-  "organizations": [],
-  "dates": [],
-  "events": [],
-  "phones": [],
-  "emails": []
-}}
+        # More explicit prompt for valid JSON (instructions live in the context
+        # cache when one is available)
+        cached_model = _context_cached_models.get("data.extract")
+        if cached_model:
+            prompt_prefix = TEXT_PREFIX
+        else:
+            prompt_prefix = EXTRACTION_PROMPT_PREFIX
 
-Important: Return ONLY the JSON object, no markdown, no explanation, no code blocks."""
+        # Long inputs are optionally split so the chunks are extracted in parallel
+        if EXTRACTION_CHUNK_CHARS and len(text) > EXTRACTION_CHUNK_CHARS:
+            chunks = split_text_chunks(text, EXTRACTION_CHUNK_CHARS)
+        else:
+            chunks = [text]
 
         if task:
-            task["progress"] = 50
-
-        # Generate entity extraction with timeout
-        response = await asyncio.wait_for(
-            asyncio.to_thread(model.generate_content, prompt),
+            update_task(task, progress=50)
+
+        # Generate entity extraction with timeout (repeated prompts are served from cache)
+        raws = await asyncio.wait_for(
+            generate_chunked(
+                "data.extract", [prompt_prefix + chunk for chunk in chunks],
+                model=cached_model, generation_config=EXTRACTION_GENERATION_CONFIG
+            ),
             timeout=30.0
         )
-        
-        result_text = response.text.strip()
+
+        result_texts = [raw.strip() for raw in raws]
 
         if task:
-            task["progress"] = 70
+            update_task(task, progress=70)
 
-        # Clean up JSON response more aggressively
-        # Remove markdown code blocks if present
-        result_text = result_text.replace('```json', '').replace('```', '').strip()
-        
-        # Remove any text before the first {
-        if '{' in result_text:
-            result_text = result_text[result_text.index('{'):]
-        
-        # Remove any text after the last }
-        if '}' in result_text:
-            result_text = result_text[:result_text.rindex('}')+1]
-        
         # Log the response for debugging
-        logger.info(f"Gemini response (first 200 chars): {result_text[:200]}")
+        logger.debug("Gemini response (first 200 chars): %s", result_texts[0][:200])
 
         try:
-            # Parse JSON response
-            extracted_data = json.loads(result_text)
-        except json.JSONDecodeError as e:
+            # Parse JSON responses (JSON mode returns the object without fences)
+            parsed = []
+            for result_text in result_texts:
+                parsed.append(orjson.loads(result_text))
+            extracted_data = parsed[0] if len(parsed) == 1 else merge_extractions(parsed)
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON: {result_text[:500]}")
             # Fallback: try to extract with regex or return empty structure
             extracted_data = {
@@ -1307,33 +1971,29 @@ Important: Return ONLY the JSON object, no markdown, no explanation, no code blo
             }
             
             # Simple extraction fallback
-            import re
-            
+
             # Extract emails
-            emails = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
+            emails = _EMAIL_RE.findall(text)
             if emails:
                 extracted_data["emails"] = [{"name": email, "salience": 0.8} for email in emails]
             
             # Extract phone numbers
-            phones = re.findall(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', text)
+            phones = _PHONE_RE.findall(text)
             if phones:
                 extracted_data["phones"] = [{"name": phone, "salience": 0.7} for phone in phones]
 
-        # Calculate entity count and average confidence
-        entity_count = 0
-        total_salience = 0.0
-
-        for entity_type, entities in extracted_data.items():
-            if isinstance(entities, list):
-                entity_count += len(entities)
-                for entity in entities:
-                    if isinstance(entity, dict) and 'salience' in entity:
-                        total_salience += entity.get('salience', 0)
-
-        avg_confidence = round(total_salience / entity_count, 2) if entity_count > 0 else 0.0
+        # Calculate entity count and average confidence in a single pass (every
+        # list item counts as an entity; non-dict items contribute salience 0)
+        saliences = [
+            entity.get('salience', 0) if isinstance(entity, dict) else 0
+            for entities in extracted_data.values() if isinstance(entities, list)
+            for entity in entities
+        ]
+        entity_count = len(saliences)
+        avg_confidence = round(sum(saliences) / entity_count, 2) if entity_count else 0.0
 
         if task:
-            task["progress"] = 90
+            update_task(task, progress=90)
 
         return {
             "extracted_data": extracted_data,
@@ -1350,4 +2010,6 @@ Important: Return ONLY the JSON object, no markdown, no explanation, no code blo
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # uvloop + httptools ship with uvicorn[standard]. Single worker: tasks live in
+    # process memory, so scale out with Cloud Run instances instead.
+    uvicorn.run(app, host="0.0.0.0", port=8080, loop="uvloop", http="httptools")
\ No newline at end of file